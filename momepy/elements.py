@@ -4,17 +4,22 @@
 # elements.py
 # generating derived elements (street edge, block)
 import operator
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from types import SimpleNamespace
 
 import geopandas as gpd
 import numpy as np
 import pandas as pd
 import shapely
 import libpysal
-from scipy.spatial import Voronoi
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import QhullError, Voronoi
 from shapely.geometry import MultiPolygon, Point, Polygon
-from shapely.wkt import loads
 from tqdm import tqdm
 
+from .utils import SHAPELY_GE_20
 
 __all__ = ["buffered_limit", "Tessellation", "Blocks", "get_network_id", "get_node_id"]
 
@@ -44,10 +49,11 @@ def buffered_limit(gdf, buffer=100):
     shapely.geometry.polygon.Polygon
 
     """
-    study_area = gdf.copy()
-    study_area["geometry"] = study_area.buffer(buffer)
-    built_up = study_area.geometry.unary_union
-    return built_up
+    if SHAPELY_GE_20:
+        return shapely.union_all(
+            shapely.buffer(np.asarray(gdf.geometry.values), buffer, quad_segs=16)
+        )
+    return gdf.geometry.buffer(buffer).unary_union
 
 
 class Tessellation:
@@ -81,6 +87,11 @@ class Tessellation:
         distance for negative buffer to generate space between adjacent polygons (if geometry type of gdf is (Multi)Polygon).
     segment : float (default 0.5)
         maximum distance between points after discretization
+    n_jobs : int (default 1)
+        number of processes used to generate Voronoi diagram. If larger than 1, points
+        are split into spatial tiles processed in parallel. ``-1`` uses all available
+        processors. On platforms using ``spawn`` to start processes (Windows, macOS),
+        the calling script needs to be protected by ``if __name__ == "__main__":``.
 
     Attributes
     ----------
@@ -96,8 +107,10 @@ class Tessellation:
         used shrink value
     segment : float
         used segment value
-    sindex : rtree spatial index
-        spatial index of tessellation
+    n_jobs : int
+        used number of processes
+    sindex : spatial index
+        spatial index of tessellation (STRtree with shapely 2.0, rtree otherwise)
     collapsed : list
         list of unique_id's of collapsed features (if there are some)
     multipolygons : list
@@ -116,7 +129,7 @@ class Tessellation:
     Vertices to Polygons: 100%|██████████| 33059/33059 [00:01<00:00, 31532.72it/s]
     Dissolving Voronoi polygons...
     Preparing buffer zone for edge resolving...
-    Building R-tree...
+    Building spatial index...
     100%|██████████| 42/42 [00:00<00:00, 752.54it/s]
     Cutting...
     >>> tess.tessellation.head()
@@ -132,13 +145,19 @@ class Tessellation:
     queen_corners is currently experimental method only and can cause errors.
     """
 
-    def __init__(self, gdf, unique_id, limit, shrink=0.4, segment=0.5):
+    def __init__(self, gdf, unique_id, limit, shrink=0.4, segment=0.5, n_jobs=1):
         self.gdf = gdf
         self.id = gdf[unique_id]
         self.limit = limit
         self.shrink = shrink
         self.segment = segment
 
+        if n_jobs == 0 or n_jobs < -1:
+            raise ValueError(
+                "n_jobs has to be a positive integer or -1, not {}.".format(n_jobs)
+            )
+        self.n_jobs = n_jobs
+
         objects = gdf.copy()
 
         centre = self._get_centre(objects)
@@ -158,10 +177,22 @@ class Tessellation:
         objects.reset_index(inplace=True, drop=True)
 
         print("Discretization...")
-        objects["geometry"] = objects["geometry"].apply(self._densify, segment=segment)
+        if SHAPELY_GE_20:
+            objects["geometry"] = self._densify(objects.geometry.values, segment)
+        else:
+            objects["geometry"] = objects["geometry"].apply(
+                self._densify, segment=segment
+            )
 
         print("Generating input point array...")
         points, ids = self._point_array(objects, unique_id)
+        # coinciding points of the same object would generate duplicated cells
+        unique = (
+            ~pd.DataFrame({"x": points[:, 0], "y": points[:, 1], "id": ids})
+            .duplicated()
+            .values
+        )
+        points, ids = points[unique], ids[unique]
 
         # add convex hull buffered large distance to eliminate infinity issues
         series = gpd.GeoSeries(limit, crs=gdf.crs).translate(
@@ -169,21 +200,35 @@ class Tessellation:
         )
         hull = series.geometry[0].convex_hull.buffer(300)
         hull = self._densify(hull, 20)
-        hull_array = np.array(hull.boundary.coords).tolist()
-        for i, a in enumerate(hull_array):
-            points.append(hull_array[i])
-            ids.append(-1)
+        hull_array = np.asarray(hull.boundary.coords)
+        points = np.vstack([points, hull_array])
+        ids = np.concatenate(
+            [
+                ids,
+                np.full(
+                    len(hull_array),
+                    -1,
+                    dtype=ids.dtype if ids.dtype.kind in "iuf" else object,
+                ),
+            ]
+        )
 
         print("Generating Voronoi diagram...")
-        voronoi_diagram = Voronoi(np.array(points))
+        if n_jobs == 1:
+            voronoi_diagram = Voronoi(points)
+        else:
+            voronoi_diagram = self._voronoi_parallel(points, ids, n_jobs)
 
         print("Generating GeoDataFrame...")
         regions_gdf = self._regions(voronoi_diagram, unique_id, ids, crs=gdf.crs)
 
         print("Dissolving Voronoi polygons...")
-        morphological_tessellation = regions_gdf[[unique_id, "geometry"]].dissolve(
-            by=unique_id, as_index=False
-        )
+        if SHAPELY_GE_20:
+            morphological_tessellation = self._dissolve(regions_gdf, unique_id)
+        else:
+            morphological_tessellation = regions_gdf[[unique_id, "geometry"]].dissolve(
+                by=unique_id, as_index=False
+            )
 
         morphological_tessellation["geometry"] = morphological_tessellation[
             "geometry"
@@ -217,20 +262,28 @@ class Tessellation:
         changes = {}
         qid = 0
 
-        for ix, row in tqdm(tessellation.iterrows(), total=tessellation.shape[0]):
-            corners = []
+        if SHAPELY_GE_20:
+            cells_corners = self._corners(tessellation)
+        else:
+            cells_corners = []
+            for cell in tqdm(tessellation.geometry, total=tessellation.shape[0]):
+                corners = []
+
+                coords = cell.exterior.coords
+                for i in coords:
+                    point = Point(i)
+                    possible_matches_index = list(
+                        self.sindex.intersection(point.bounds)
+                    )
+                    possible_matches = tessellation.iloc[possible_matches_index]
+                    precise_matches = sum(possible_matches.intersects(point))
+                    if precise_matches > 2:
+                        corners.append(point)
+                cells_corners.append(corners)
+
+        for corners in cells_corners:
             change = []
 
-            cell = row.geometry
-            coords = cell.exterior.coords
-            for i in coords:
-                point = Point(i)
-                possible_matches_index = list(self.sindex.intersection(point.bounds))
-                possible_matches = tessellation.iloc[possible_matches_index]
-                precise_matches = sum(possible_matches.intersects(point))
-                if precise_matches > 2:
-                    corners.append(point)
-
             if len(corners) > 2:
                 for c, it in enumerate(corners):
                     next_c = c + 1
@@ -252,14 +305,21 @@ class Tessellation:
                     changes[(points[1].x, points[1].y)] = new
                     qid = qid + 1
 
-        for ix, row in tqdm(tessellation.iterrows(), total=tessellation.shape[0]):
-            cell = row.geometry
+        new_geoms = np.array(tessellation.geometry.values, dtype=object)
+        if SHAPELY_GE_20:
+            # only cells with at least one vertex to be changed need to be fixed
+            cells = np.nonzero(self._touched(new_geoms, changes))[0]
+        else:
+            cells = range(len(new_geoms))
+        for ix in tqdm(cells, total=len(cells)):
+            cell = new_geoms[ix]
             coords = list(cell.exterior.coords)
 
-            moves = {}
-            for x in coords:
-                if x in changes.keys():
-                    moves[coords.index(x)] = changes[x]
+            # position of the first occurrence of each vertex
+            pos = {}
+            for i, x in enumerate(coords):
+                pos.setdefault(x, i)
+            moves = {pos[x]: changes[x] for x in coords if x in changes}
             keys = list(moves.keys())
             delete_points = []
             for move, k in enumerate(keys):
@@ -273,10 +333,9 @@ class Tessellation:
                         )
                         # change the code above to have if based on distance not number
 
-            newcoords = [changes[x][0] if x in changes.keys() else x for x in coords]
-            for coord in newcoords:
-                if coord in delete_points:
-                    newcoords.remove(coord)
+            delete_set = set(delete_points)
+            newcoords = [changes[x][0] if x in changes else x for x in coords]
+            newcoords = [x for x in newcoords if x not in delete_set]
             if coords != newcoords:
                 if not cell.interiors:
                     # newgeom = Polygon(newcoords).buffer(0)
@@ -285,16 +344,50 @@ class Tessellation:
                     if len(list(shapely.ops.polygonize(mls))) > 1:
                         newgeom = MultiPolygon(shapely.ops.polygonize(mls))
                         geoms = []
-                        for g, n in enumerate(newgeom):
-                            geoms.append(newgeom[g].area)
-                        newgeom = newgeom[geoms.index(max(geoms))]
+                        for g, n in enumerate(newgeom.geoms):
+                            geoms.append(newgeom.geoms[g].area)
+                        newgeom = newgeom.geoms[geoms.index(max(geoms))]
                     else:
                         newgeom = list(shapely.ops.polygonize(mls))[0]
                 else:
                     newgeom = Polygon(newcoords, holes=cell.interiors)
-                tessellation.loc[ix, "geometry"] = newgeom
+                new_geoms[ix] = newgeom
+        tessellation["geometry"] = gpd.GeoSeries(
+            new_geoms, index=tessellation.index, crs=tessellation.crs
+        )
         return tessellation
 
+    def _corners(self, tessellation):
+        """
+        Returns list of corner points (shared by more than two cells) of each cell
+        (shapely 2.0).
+        """
+        coords, cell_idx = shapely.get_coordinates(
+            shapely.get_exterior_ring(tessellation.geometry.values), return_index=True
+        )
+        points = shapely.points(coords)
+        point_idx, _ = tessellation.sindex.query(points, predicate="intersects")
+        corner = np.bincount(point_idx, minlength=len(points)) > 2
+
+        cells_corners = [[] for _ in range(len(tessellation))]
+        for point, ix in zip(points[corner], cell_idx[corner]):
+            cells_corners[ix].append(point)
+        return cells_corners
+
+    def _touched(self, geoms, changes):
+        """
+        Returns boolean array marking geoms with exterior vertices in changes
+        (shapely 2.0).
+        """
+        if not changes:
+            return np.zeros(len(geoms), dtype=bool)
+        coords, cell_idx = shapely.get_coordinates(
+            shapely.get_exterior_ring(geoms), return_index=True
+        )
+        vertices = pd.MultiIndex.from_arrays([coords[:, 0], coords[:, 1]])
+        hit = vertices.isin(list(changes))
+        return np.bincount(cell_idx[hit], minlength=len(geoms)) > 0
+
     def _get_centre(self, gdf):
         """
         Returns centre coords of gdf.
@@ -308,7 +401,14 @@ class Tessellation:
     def _densify(self, geom, segment):
         """
         Returns densified geoemtry with segments no longer than `segment`.
+
+        With shapely 2.0, ``geom`` can be a single geometry or an array of geometries.
         """
+        if SHAPELY_GE_20:
+            return shapely.segmentize(geom, segment)
+
+        from shapely.wkt import loads
+
         # temporary solution for readthedocs fail. - cannot mock osgeo
         try:
             from osgeo import ogr
@@ -331,37 +431,151 @@ class Tessellation:
 
     def _point_array(self, objects, unique_id):
         """
-        Returns lists of points and ids based on geometry and unique_id.
+        Returns arrays of points and ids based on geometry and unique_id.
         """
+        if SHAPELY_GE_20:
+            return self._point_array_vectorized(objects, unique_id)
+
         points = []
         ids = []
-        for idx, row in tqdm(objects.iterrows(), total=objects.shape[0]):
-            if row["geometry"].type in ["Polygon", "MultiPolygon"]:
-                poly_ext = row["geometry"].boundary
+        for geom, uid in tqdm(
+            zip(objects.geometry, objects[unique_id]), total=objects.shape[0]
+        ):
+            if geom.type in ["Polygon", "MultiPolygon"]:
+                poly_ext = geom.boundary
             else:
-                poly_ext = row["geometry"]
+                poly_ext = geom
             if poly_ext is not None:
                 if poly_ext.type == "MultiLineString":
-                    for line in poly_ext:
-                        point_coords = line.coords
-                        row_array = np.array(point_coords[:-1]).tolist()
-                        for i, a in enumerate(row_array):
-                            points.append(row_array[i])
-                            ids.append(row[unique_id])
+                    lines = list(poly_ext.geoms)
                 elif poly_ext.type == "LineString":
-                    point_coords = poly_ext.coords
-                    row_array = np.array(point_coords[:-1]).tolist()
-                    for i, a in enumerate(row_array):
-                        points.append(row_array[i])
-                        ids.append(row[unique_id])
+                    lines = [poly_ext]
                 else:
                     raise Exception("Boundary type is {}".format(poly_ext.type))
+                for line in lines:
+                    point_coords = np.asarray(line.coords)[:-1]
+                    points.append(point_coords)
+                    ids.append(np.full(len(point_coords), uid))
+        return np.concatenate(points), np.concatenate(ids)
+
+    def _point_array_vectorized(self, objects, unique_id):
+        """
+        Returns arrays of points and ids based on geometry and unique_id (shapely 2.0).
+        """
+        geoms = np.array(objects.geometry.values, dtype=object)
+        polygonal = np.isin(shapely.get_type_id(geoms), [3, 6])
+        geoms[polygonal] = shapely.boundary(geoms[polygonal])
+
+        parts, part_index = shapely.get_parts(geoms, return_index=True)
+        invalid = ~np.isin(shapely.get_type_id(parts), [1, 2])
+        if invalid.any():
+            raise Exception("Boundary type is {}".format(parts[invalid][0].geom_type))
+
+        coords, coord_index = shapely.get_coordinates(parts, return_index=True)
+        # drop the last vertex of each part (closing vertex of the ring)
+        last = np.append(coord_index[1:] != coord_index[:-1], True)
+        points = coords[~last]
+        ids = objects[unique_id].values[part_index[coord_index[~last]]]
         return points, ids
 
+    def _voronoi_parallel(self, points, ids, n_jobs):
+        """
+        Returns Voronoi diagram of points computed in parallel on spatial tiles.
+
+        Each tile is processed together with a margin of surrounding points. Cells of
+        points within the tile are accepted only if circumcircles of all their vertices
+        lie within the processed extent (hence are not affected by points outside),
+        otherwise the margin is doubled. The result mimics the ``vertices``,
+        ``regions`` and ``point_region`` attributes of ``scipy.spatial.Voronoi``.
+        """
+        points = np.asarray(points)
+        real = np.asarray(ids) != -1
+        if n_jobs == -1:
+            n_jobs = os.cpu_count()
+
+        k = int(np.ceil(np.sqrt(n_jobs)))
+        quantiles = np.linspace(0, 1, k + 1)
+        x_edges = np.quantile(points[:, 0], quantiles)
+        y_edges = np.quantile(points[:, 1], quantiles)
+        col = np.searchsorted(x_edges, points[:, 0], side="right") - 1
+        row = np.searchsorted(y_edges, points[:, 1], side="right") - 1
+        tiles = np.clip(row, 0, k - 1) * k + np.clip(col, 0, k - 1)
+
+        margins = {}
+        for t in np.unique(tiles[real]):
+            r, c = divmod(t, k)
+            margins[t] = (
+                max(x_edges[c + 1] - x_edges[c], y_edges[r + 1] - y_edges[r]) / 10
+            )
+
+        regions = [[-1]] * len(points)
+        vertices = []
+        n_vertices = 0
+        lookup = {}
+        pending = list(margins)
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            while pending:
+                futures = {}
+                for t in pending:
+                    r, c = divmod(t, k)
+                    m = margins[t]
+                    extent = (
+                        x_edges[c] - m,
+                        y_edges[r] - m,
+                        x_edges[c + 1] + m,
+                        y_edges[r + 1] + m,
+                    )
+                    subset = np.nonzero(
+                        (points[:, 0] >= extent[0])
+                        & (points[:, 1] >= extent[1])
+                        & (points[:, 0] <= extent[2])
+                        & (points[:, 1] <= extent[3])
+                    )[0]
+                    own = tiles[subset] == t
+                    core = own & real[subset]
+                    if len(subset) == len(points):
+                        extent = None
+                    futures[t] = (
+                        subset[core],
+                        executor.submit(
+                            _voronoi_tile, points[subset], subset, own, core, extent
+                        ),
+                    )
+
+                pending = []
+                for t, (core, future) in futures.items():
+                    result = future.result()
+                    if result is None:
+                        margins[t] *= 2
+                        pending.append(t)
+                        continue
+                    lengths, cells, coords, seam, keys = result
+                    position = np.arange(n_vertices, n_vertices + len(coords))
+                    # vertices shared with already processed tiles are reused
+                    for j, key in zip(np.nonzero(seam)[0], keys):
+                        if key in lookup:
+                            position[j] = lookup[key]
+                        else:
+                            lookup[key] = position[j]
+                    cells = np.split(position[cells], np.cumsum(lengths)[:-1])
+                    for i, cell in zip(core, cells):
+                        regions[i] = cell
+                    vertices.append(coords)
+                    n_vertices += len(coords)
+
+        return SimpleNamespace(
+            vertices=np.concatenate(vertices),
+            regions=regions,
+            point_region=np.arange(len(points)),
+        )
+
     def _regions(self, voronoi_diagram, unique_id, ids, crs):
         """
         Generate GeoDataFrame of Voronoi regions from scipy.spatial.Voronoi.
         """
+        if SHAPELY_GE_20:
+            return self._regions_vectorized(voronoi_diagram, unique_id, ids, crs)
+
         # generate DataFrame of results
         regions = pd.DataFrame()
         regions[unique_id] = ids  # add unique id
@@ -394,6 +608,64 @@ class Tessellation:
         regions_gdf.crs = crs
         return regions_gdf
 
+    def _regions_vectorized(self, voronoi_diagram, unique_id, ids, crs):
+        """
+        Generate GeoDataFrame of Voronoi regions using vectorized shapely functions.
+        """
+        ids = np.asarray(ids)
+        regions = [voronoi_diagram.regions[r] for r in voronoi_diagram.point_region]
+        lengths = np.array([len(region) for region in regions], dtype=int)
+        vertices = np.concatenate(regions).astype(int)
+        point = np.repeat(np.arange(len(regions)), lengths)
+
+        # skip open and hull-based cells
+        open_cell = np.bincount(point, weights=vertices == -1, minlength=len(regions))
+        valid = (lengths > 0) & (open_cell == 0) & (ids != -1)
+        # coinciding points of the same object share a region, keep it only once
+        valid &= (
+            ~pd.DataFrame({"id": ids, "region": voronoi_diagram.point_region})
+            .duplicated()
+            .values
+        )
+        mask = valid[point]
+
+        indices = np.repeat(np.arange(valid.sum()), lengths[valid])
+        polygons = shapely.polygons(
+            shapely.linearrings(
+                voronoi_diagram.vertices[vertices[mask]], indices=indices
+            )
+        )
+
+        regions_gdf = gpd.GeoDataFrame(
+            {unique_id: ids[valid], "geometry": polygons},
+            index=np.nonzero(valid)[0],
+            crs=crs,
+        )
+        return regions_gdf.loc[shapely.length(polygons) < 1000000]  # delete errors
+
+    def _dissolve(self, regions_gdf, unique_id):
+        """
+        Dissolve Voronoi regions by unique_id.
+
+        Voronoi regions do not overlap and share identical edges, hence they can be
+        merged by coverage union, which is faster than generic unary union. Groups
+        which coverage union cannot process are merged by unary union.
+        """
+        codes, uids = pd.factorize(regions_gdf[unique_id], sort=True)
+        order = np.argsort(codes, kind="stable")
+        geoms = np.asarray(regions_gdf.geometry.values)[order]
+        starts = np.searchsorted(codes[order], np.arange(len(uids)))
+        ends = np.append(starts[1:], len(order))
+        dissolved = []
+        for start, end in zip(starts, ends):
+            try:
+                dissolved.append(shapely.coverage_union_all(geoms[start:end]))
+            except shapely.errors.GEOSException:
+                dissolved.append(shapely.union_all(geoms[start:end]))
+        return gpd.GeoDataFrame(
+            {unique_id: uids, "geometry": dissolved}, crs=regions_gdf.crs
+        )
+
     def _cut(self, tessellation, limit, unique_id):
         """
         Cut tessellation by the limit (Multi)Polygon.
@@ -403,8 +675,37 @@ class Tessellation:
         print("Preparing limit for edge resolving...")
         geometry_cut = _split_lines(limit, 100)
 
-        print("Building R-tree...")
+        print("Building spatial index...")
         sindex = tessellation.sindex
+
+        if SHAPELY_GE_20:
+            print("Identifying edge cells...")
+            _, tess_idx = sindex.query(
+                shapely.get_parts(geometry_cut), predicate="intersects"
+            )
+            subselection = np.unique(tess_idx)
+
+            print("Cutting...")
+            geoms = np.array(tessellation.geometry.values, dtype=object)
+            intersection = shapely.intersection(geoms[subselection], limit)
+            # keep the largest polygon of MultiPolygon and GeometryCollection results
+            multi = np.nonzero(np.isin(shapely.get_type_id(intersection), [6, 7]))[0]
+            if len(multi) > 0:
+                parts, part_idx = shapely.get_parts(
+                    intersection[multi], return_index=True
+                )
+                polygons = shapely.get_type_id(parts) == 3
+                parts, part_idx = parts[polygons], part_idx[polygons]
+                largest = pd.Series(shapely.area(parts)).groupby(part_idx).idxmax()
+                # results without any polygon are left uncut
+                intersection[multi] = geoms[subselection[multi]]
+                intersection[multi[largest.index]] = parts[largest.values]
+            geoms[subselection] = intersection
+            tessellation["geometry"] = gpd.GeoSeries(
+                geoms, index=tessellation.index, crs=tessellation.crs
+            )
+            return tessellation, sindex
+
         # find the points that intersect with each subpolygon and add them to points_within_geometry
         print("Identifying edge cells...")
         to_cut = pd.DataFrame()
@@ -420,26 +721,27 @@ class Tessellation:
         subselection = list(to_cut.index)
 
         print("Cutting...")
-        for idx, rgeom in tqdm(
-            tessellation.loc[subselection].geometry.iteritems(),
-            total=tessellation.loc[subselection].shape[0],
-        ):
-            intersection = rgeom.intersection(limit)
+        new_geoms = np.array(tessellation.geometry.values, dtype=object)
+        for ix in tqdm(tessellation.index.get_indexer(subselection)):
+            intersection = new_geoms[ix].intersection(limit)
             if intersection.type == "MultiPolygon":
                 areas = {}
                 for p, i in enumerate(intersection):
                     area = intersection[p].area
                     areas[p] = area
                 maximal = max(areas.items(), key=operator.itemgetter(1))[0]
-                tessellation.loc[idx, "geometry"] = intersection[maximal]
+                new_geoms[ix] = intersection[maximal]
             elif intersection.type == "GeometryCollection":
                 for geom in list(intersection.geoms):
                     if geom.type != "Polygon":
                         pass
                     else:
-                        tessellation.loc[idx, "geometry"] = geom
+                        new_geoms[ix] = geom
             else:
-                tessellation.loc[idx, "geometry"] = intersection
+                new_geoms[ix] = intersection
+        tessellation["geometry"] = gpd.GeoSeries(
+            new_geoms, index=tessellation.index, crs=tessellation.crs
+        )
         return tessellation, sindex
 
     def _check_result(self, tesselation, orig_gdf, unique_id):
@@ -561,54 +863,39 @@ class Blocks:
         streets_index = street_buff.sindex
 
         print("Difference...")
-        new_geom = []
+        if SHAPELY_GE_20:
+            new_geom = self._difference(cells_copy, street_buff, streets_index)
+        else:
+            new_geom = []
 
-        for ix, cell in tqdm(
-            cells_copy.geometry.iteritems(), total=cells_copy.shape[0]
-        ):
-            possible_matches_index = list(streets_index.intersection(cell.bounds))
-            possible_matches = street_buff.iloc[possible_matches_index]
-            new_geom.append(cell.difference(possible_matches.geometry.unary_union))
+            for ix, cell in tqdm(
+                cells_copy.geometry.iteritems(), total=cells_copy.shape[0]
+            ):
+                possible_matches_index = list(streets_index.intersection(cell.bounds))
+                possible_matches = street_buff.iloc[possible_matches_index]
+                new_geom.append(cell.difference(possible_matches.geometry.unary_union))
 
         print("Defining adjacency...")
-        blocks_gdf = gpd.GeoDataFrame(geometry=gpd.GeoSeries(new_geom))
-        blocks_gdf = blocks_gdf.explode().reset_index(drop=True)
-
-        spatial_weights = libpysal.weights.Queen.from_dataframe(
-            blocks_gdf, silence_warnings=True
-        )
+        if SHAPELY_GE_20:
+            blocks_gdf = gpd.GeoDataFrame(geometry=shapely.get_parts(new_geom))
+        else:
+            blocks_gdf = gpd.GeoDataFrame(geometry=gpd.GeoSeries(new_geom))
+            blocks_gdf = blocks_gdf.explode().reset_index(drop=True)
+
+        if SHAPELY_GE_20:
+            geoms = blocks_gdf.geometry.values
+            left, right = shapely.STRtree(geoms).query(geoms, predicate="touches")
+            n = len(blocks_gdf)
+            adjacency = coo_matrix(
+                (np.ones(len(left), dtype=bool), (left, right)), shape=(n, n)
+            )
+        else:
+            adjacency = libpysal.weights.Queen.from_dataframe(
+                blocks_gdf, silence_warnings=True
+            ).sparse
 
-        patches = {}
-        jID = 1
-        for idx in tqdm(blocks_gdf.index, total=blocks_gdf.shape[0]):
-
-            # if the id is already present in courtyards, continue (avoid repetition)
-            if idx in patches:
-                continue
-            else:
-                to_join = [idx]  # list of indices which should be joined together
-                neighbours = []  # list of neighbours
-                weights = spatial_weights.neighbors[
-                    idx
-                ]  # neighbours from spatial weights
-                for w in weights:
-                    neighbours.append(w)  # make a list from weigths
-
-                for n in neighbours:
-                    while (
-                        n not in to_join
-                    ):  # until there is some neighbour which is not in to_join
-                        to_join.append(n)
-                        weights = spatial_weights.neighbors[n]
-                        for w in weights:
-                            neighbours.append(
-                                w
-                            )  # extend neighbours by neighbours of neighbours :)
-                for b in to_join:
-                    patches[b] = jID  # fill dict with values
-                jID = jID + 1
-
-        blocks_gdf["patch"] = blocks_gdf.index.map(patches)
+        _, labels = connected_components(adjacency, directed=False)
+        blocks_gdf["patch"] = labels
 
         print("Defining street-based blocks...")
         blocks_single = blocks_gdf.dissolve(by="patch")
@@ -640,24 +927,38 @@ class Blocks:
         blocks = blocks.explode()
         blocks.reset_index(inplace=True, drop=True)
 
-        blocks["geometry"] = blocks.exterior
         blocks[id_name] = range(len(blocks))
 
-        blocks["geometry"] = blocks.apply(lambda row: Polygon(row.geometry), axis=1)
+        # fill holes
+        if SHAPELY_GE_20:
+            new_geoms = shapely.polygons(
+                shapely.get_exterior_ring(blocks.geometry.values)
+            )
+        else:
+            new_geoms = [Polygon(geom.exterior) for geom in blocks.geometry]
+        blocks["geometry"] = gpd.GeoSeries(
+            new_geoms, index=blocks.index, crs=blocks.crs
+        )
 
         # if polygon is within another one, delete it
         sindex = blocks.sindex
-        for idx, geom in tqdm(blocks.geometry.iteritems(), total=blocks.shape[0]):
-            possible_matches = list(sindex.intersection(geom.bounds))
-            possible_matches.remove(idx)
-            possible = blocks.iloc[possible_matches]
+        delete = np.zeros(len(blocks), dtype=bool)
+        if SHAPELY_GE_20:
+            inp, tree = sindex.query(
+                np.asarray(blocks.geometry.values), predicate="within"
+            )
+            delete[inp[inp != tree]] = True
+        else:
+            for idx, geom in enumerate(tqdm(blocks.geometry, total=blocks.shape[0])):
+                possible_matches = list(sindex.intersection(geom.bounds))
+                possible_matches.remove(idx)
+                possible = blocks.iloc[possible_matches]
 
-            for geom2 in possible.geometry:
-                if geom.within(geom2):
-                    blocks.loc[idx, "delete"] = 1
+                for geom2 in possible.geometry:
+                    if geom.within(geom2):
+                        delete[idx] = True
 
-        if "delete" in blocks.columns:
-            blocks = blocks.drop(list(blocks.loc[blocks["delete"] == 1].index))
+        blocks = blocks[~delete]
 
         self.blocks = blocks[[id_name, "geometry"]]
 
@@ -678,6 +979,38 @@ class Blocks:
         )
         self.tessellation_id = cells_m[id_name]
 
+    def _difference(self, cells, street_buff, streets_index):
+        """
+        Returns array of cells without the parts covered by buffered streets
+        (shapely 2.0).
+
+        Streets are unioned per cell, using only those intersecting the cell, and all
+        differences are computed in a single vectorized call.
+        """
+        new_geom = np.array(cells.geometry.values, dtype=object)
+        cell_idx, street_idx = streets_index.query(
+            np.asarray(cells.geometry.values), predicate="intersects"
+        )
+        if len(cell_idx) == 0:
+            return new_geom
+
+        order = np.argsort(cell_idx, kind="stable")
+        cell_idx, street_idx = cell_idx[order], street_idx[order]
+        hits, starts, counts = np.unique(
+            cell_idx, return_index=True, return_counts=True
+        )
+        streets = np.asarray(street_buff.geometry.values)[street_idx]
+
+        # cells intersecting the same number of streets are unioned row-wise at once
+        unions = np.empty(len(hits), dtype=object)
+        for count in np.unique(counts):
+            group = np.flatnonzero(counts == count)
+            rows = streets[starts[group, np.newaxis] + np.arange(count)]
+            unions[group] = shapely.union_all(rows, axis=1)
+
+        new_geom[hits] = shapely.difference(new_geom[hits], unions)
+        return new_geom
+
 
 def get_network_id(left, right, network_id, min_size=100):
     """
@@ -708,58 +1041,94 @@ def get_network_id(left, right, network_id, min_size=100):
     --------
     >>> buildings_df['nID'] = momepy.get_network_id(buildings_df, streets_df, 'nID')
     Generating centroids...
-    Generating rtree...
-    Snapping: 100%|██████████| 144/144 [00:00<00:00, 2718.98it/s]
+    Generating spatial index...
+    Snapping 144 objects...
     >>> buildings_df['nID'][0]
     1
     """
-    INFTY = 1000000000000
     MIN_SIZE = min_size
     # MIN_SIZE should be a vaule such that if you build a box centered in each
     # point with edges of size 2*MIN_SIZE, you know a priori that at least one
     # segment is intersected with the box. Otherwise, you could get an inexact
     # solution, there is an exception checking this, though.
-    left = left.copy()
-    right = right.copy()
-
-    if not isinstance(network_id, str):
-        right["mm_nid"] = network_id
-        network_id = "mm_nid"
+    if isinstance(network_id, str):
+        nids = right[network_id].values
+    else:
+        nids = pd.Series(network_id, index=right.index).values
 
     print("Generating centroids...")
-    buildings_c = left.copy()
-
-    buildings_c["geometry"] = buildings_c.centroid  # make centroids
-
-    print("Generating rtree...")
-    idx = right.sindex
-
-    result = []
-    for p in tqdm(buildings_c.geometry, total=buildings_c.shape[0], desc="Snapping"):
-        pbox = (p.x - MIN_SIZE, p.y - MIN_SIZE, p.x + MIN_SIZE, p.y + MIN_SIZE)
-        hits = list(idx.intersection(pbox))
-        d = INFTY
-        nid = None
-        for h in hits:
-            new_d = p.distance(right.geometry.iloc[h])
-            if d >= new_d:
-                d = new_d
-                nid = right[network_id].iloc[h]
-        if nid is None:
-            result.append(np.nan)
-        else:
-            result.append(nid)
-
-    series = pd.Series(result)
+    if SHAPELY_GE_20:
+        centroids = shapely.centroid(np.asarray(left.geometry.values))
+    else:
+        centroids = left.geometry.centroid
+
+    print("Generating spatial index...")
+    if SHAPELY_GE_20:
+        tree = shapely.STRtree(np.asarray(right.geometry.values))
+    else:
+        idx = right.sindex
+
+    B, C, line = _segments(right.geometry)
+    # segments are stored as separate contiguous arrays of coordinates relative
+    # to a local origin, which keeps float32 precise enough to compare distances
+    origin = B.min(axis=0) if len(B) else np.zeros(2)
+    Bx, By = np.ascontiguousarray((B - origin).T, dtype=np.float32)
+    CBx, CBy = np.ascontiguousarray((C - B).T, dtype=np.float32)
+    segments = (Bx, By, CBx, CBy, CBx**2 + CBy**2)
+    seg_nid = nids[line]
+    # segments of each line are stored consecutively
+    line_start = np.searchsorted(line, np.arange(len(right)))
+    line_end = np.searchsorted(line, np.arange(len(right)), side="right")
+
+    print("Snapping {} objects...".format(len(left)))
+    if SHAPELY_GE_20:
+        x, y = shapely.get_x(centroids), shapely.get_y(centroids)
+        boxes = shapely.box(x - MIN_SIZE, y - MIN_SIZE, x + MIN_SIZE, y + MIN_SIZE)
+        point_idx, hits = tree.query(boxes)
+    else:
+        x, y = centroids.x.values, centroids.y.values
+        boxes = centroids.buffer(MIN_SIZE, cap_style=3)
+        point_idx, hits = idx.query_bulk(boxes)
+
+    # expand (point, line) pairs to (point, segment) pairs
+    lengths = line_end[hits] - line_start[hits]
+    offsets = np.cumsum(lengths) - lengths
+    point_idx = np.repeat(point_idx, lengths)
+    segment_idx = np.repeat(line_start[hits] - offsets, lengths) + np.arange(
+        lengths.sum()
+    )
+    # points with a single candidate segment do not need any distance
+    single = np.bincount(point_idx, minlength=len(x))[point_idx] == 1
+    nearest_points, nearest_segments = _nearest_segment(
+        (x - origin[0]).astype(np.float32),
+        (y - origin[1]).astype(np.float32),
+        segments,
+        point_idx[~single],
+        segment_idx[~single],
+    )
+    point_idx = np.concatenate([point_idx[single], nearest_points])
+    segment_idx = np.concatenate([segment_idx[single], nearest_segments])
+    order = np.argsort(point_idx, kind="stable")
+    point_idx = point_idx[order]
+    snapped = seg_nid[segment_idx[order]]
+
+    if len(point_idx) == len(left):  # positions are unique, so all are snapped
+        nid_out = snapped
+    else:
+        nid_out = np.full(
+            len(left), np.nan, dtype=float if snapped.dtype.kind in "iuf" else object
+        )
+        nid_out[point_idx] = snapped
 
-    if series.isnull().any():
+    missing = pd.isna(nid_out).sum()
+    if missing:
         import warnings
 
         warnings.warn(
             "Some objects were not attached to the network. "
-            "Set larger min_size. {} affected elements".format(sum(series.isnull()))
+            "Set larger min_size. {} affected elements".format(missing)
         )
-    return series
+    return pd.Series(nid_out, index=left.index)
 
 
 def get_node_id(objects, nodes, edges, node_id, edge_id):
@@ -793,34 +1162,174 @@ def get_node_id(objects, nodes, edges, node_id, edge_id):
         nodes["mm_noid"] = node_id
         node_id = "mm_noid"
 
-    results_list = []
-    for row in tqdm(
-        objects[[edge_id, objects._geometry_column_name]].itertuples(),
-        total=objects.shape[0],
-    ):
-        if np.isnan(row[1]):
+    edges_by_id = edges.drop_duplicates(edge_id).set_index(edge_id)
+    nodes_by_id = nodes.drop_duplicates(node_id).set_index(node_id)
+
+    snapped = objects[edge_id].notna().values
+    eids = objects[edge_id].values[snapped]
+    starts = edges_by_id.loc[eids, "node_start"].values
+    ends = edges_by_id.loc[eids, "node_end"].values
+    start_points = nodes_by_id.geometry.loc[starts]
+    end_points = nodes_by_id.geometry.loc[ends]
+    if SHAPELY_GE_20:
+        centroids = shapely.centroid(np.asarray(objects.geometry.values)[snapped])
+        cx, cy = shapely.get_x(centroids), shapely.get_y(centroids)
+    else:
+        centroids = objects.geometry.centroid[snapped]
+        cx, cy = centroids.x.values, centroids.y.values
+    sd2 = (cx - start_points.x.values) ** 2 + (cy - start_points.y.values) ** 2
+    ed2 = (cx - end_points.x.values) ** 2 + (cy - end_points.y.values) ** 2
+    nearest = np.where(sd2 > ed2, ends, starts)
+
+    if snapped.all():
+        return pd.Series(nearest, index=objects.index)
+    series = pd.Series(np.nan, index=objects.index)
+    series[snapped] = nearest
+    return series
 
-            results_list.append(np.nan)
-        else:
-            centroid = row[2].centroid
-            edge = edges.loc[edges[edge_id] == row[1]].iloc[0]
-            startID = edge.node_start
-            start = nodes.loc[nodes[node_id] == startID].iloc[0].geometry
-            sd = centroid.distance(start)
-            endID = edge.node_end
-            end = nodes.loc[nodes[node_id] == endID].iloc[0].geometry
-            ed = centroid.distance(end)
-            if sd > ed:
-                results_list.append(endID)
-            else:
-                results_list.append(startID)
 
-    series = pd.Series(results_list, index=objects.index)
-    return series
+def _segments(geoms):
+    """
+    Returns start and end points of all segments of (Multi)LineStrings and positions
+    of lines they belong to.
+    """
+    if SHAPELY_GE_20:
+        parts, lines = shapely.get_parts(np.asarray(geoms), return_index=True)
+        coords, part = shapely.get_coordinates(parts, return_index=True)
+        # segments between consecutive vertices of the same part
+        start = np.nonzero(part[:-1] == part[1:])[0]
+        return coords[start], coords[start + 1], lines[part[start]]
+
+    coords = [np.empty((0, 2)), np.empty((0, 2))]
+    lines = [np.empty(0, dtype=int)]
+    for i, geom in enumerate(geoms):
+        if geom is None or geom.is_empty:
+            continue
+        for part in getattr(geom, "geoms", [geom]):
+            if part.is_empty:
+                continue
+            part_coords = np.asarray(part.coords)[:, :2]
+            coords.append(part_coords[:-1])
+            coords.append(part_coords[1:])
+            lines.append(np.full(len(part_coords) - 1, i))
+    starts = np.concatenate(coords[::2])
+    ends = np.concatenate(coords[1::2])
+    return starts, ends, np.concatenate(lines)
+
+
+def _segment_distance2(x, y, Bx, By, CBx, CBy, CB2):
+    """
+    Returns squared distances between points (x, y) and segments starting at
+    (Bx, By) with vectors (CBx, CBy) of squared length CB2.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = ((x - Bx) * CBx + (y - By) * CBy) / CB2
+    t = np.clip(np.nan_to_num(t), 0, 1)  # zero-length segments give nan
+    dx = x - (Bx + t * CBx)
+    dy = y - (By + t * CBy)
+    return dx * dx + dy * dy
+
+
+def _nearest_segment(x, y, segments, point_idx, segment_idx, chunk_size=10000):
+    """
+    Returns positions of points and of their closest segments out of candidate
+    (point, segment) pairs sorted by point.
+
+    ``segments`` is a tuple of arrays (Bx, By, CBx, CBy, CB2) passed to
+    :func:`_segment_distance2`. Points are processed in chunks of ``chunk_size``
+    to limit the memory footprint. Chunks are processed in a pool of threads, as
+    NumPy releases the GIL within its kernels.
+    """
+
+    def nearest(start, end):
+        pts, segs = point_idx[start:end], segment_idx[start:end]
+        d2 = _segment_distance2(x[pts], y[pts], *(a[segs] for a in segments))
+        # the closest segment is the first one of each point sorted by distance
+        order = np.lexsort((d2, pts))
+        pts, segs = pts[order], segs[order]
+        first = np.ones(len(pts), dtype=bool)
+        first[1:] = pts[1:] != pts[:-1]
+        return pts[first], segs[first]
+
+    bounds = np.searchsorted(point_idx, np.arange(0, len(x), chunk_size))
+    bounds = np.append(bounds, len(point_idx))
+    if len(bounds) > 2:
+        with ThreadPoolExecutor() as executor:
+            results = list(executor.map(nearest, bounds[:-1], bounds[1:]))
+    else:
+        results = [nearest(bounds[0], bounds[-1])]
+    nearest_points, nearest_segments = zip(*results)
+    return np.concatenate(nearest_points), np.concatenate(nearest_segments)
+
+
+def _voronoi_tile(points, index, own, core, extent):
+    """
+    Returns Voronoi cells of ``core`` points.
+
+    Cells are returned as number of vertices of each cell, positions of their vertices
+    in the array of used vertex coordinates and that array. Vertices generated also by
+    points other than ``own`` may be shared with other tiles and are identified by the
+    ``index`` of their generating points. Returns None if any of the cells could be
+    affected by points outside of ``extent`` (minx, miny, maxx, maxy).
+    ``extent=None`` means that ``points`` are complete.
+    """
+    try:
+        voronoi_diagram = Voronoi(points)
+    except QhullError:
+        if extent is None:
+            raise
+        return None
+
+    regions = [voronoi_diagram.regions[r] for r in voronoi_diagram.point_region[core]]
+    lengths = np.array([len(region) for region in regions], dtype=int)
+    cells = np.concatenate(regions).astype(int)
+    if (cells == -1).any():  # open cells
+        if extent is None:
+            raise ValueError("Voronoi cells of points are not closed.")
+        return None
+    used, cells = np.unique(cells, return_inverse=True)
+    coords = voronoi_diagram.vertices[used]
+
+    # generating points of each used vertex, sorted by vertex and point
+    ridge_vertices = np.asarray(voronoi_diagram.ridge_vertices)
+    vertex = np.repeat(ridge_vertices, 2, axis=1).ravel()
+    generator = np.tile(voronoi_diagram.ridge_points, 2).ravel()
+    mask = np.isin(vertex, used)
+    pairs = np.unique(vertex[mask] * len(points) + generator[mask])
+    vertex, generator = np.divmod(pairs, len(points))
+    vertex = np.searchsorted(used, vertex)
+    starts = np.searchsorted(vertex, np.arange(len(used)))
+
+    if extent is not None:
+        radii = np.hypot(*(coords - points[generator[starts]]).T)
+        inside = (
+            (coords[:, 0] - radii >= extent[0])
+            & (coords[:, 1] - radii >= extent[1])
+            & (coords[:, 0] + radii <= extent[2])
+            & (coords[:, 1] + radii <= extent[3])
+        )
+        if not inside.all():
+            return None
+
+    seam = np.bincount(vertex, weights=~own[generator], minlength=len(used)) > 0
+    ends = np.append(starts[1:], len(generator))
+    generator = index[generator]
+    keys = [tuple(generator[starts[v] : ends[v]]) for v in np.nonzero(seam)[0]]
+    return lengths, cells, coords, seam, keys
 
 
 def _split_lines(polygon, distance):
     """Split polygon into GeoSeries of lines no longer than `distance`."""
+    if SHAPELY_GE_20:
+        boundary = shapely.segmentize(polygon.boundary, distance)
+        coords, part = shapely.get_coordinates(
+            shapely.get_parts(boundary), return_index=True
+        )
+        # segments between consecutive vertices of the same part
+        start = np.nonzero(part[:-1] == part[1:])[0]
+        segments = np.stack([coords[start], coords[start + 1]], axis=1)
+        return gpd.GeoSeries(shapely.linestrings(segments))
+
     list_points = []
     current_dist = distance  # set the current distance to place the point
 
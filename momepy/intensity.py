@@ -178,20 +178,18 @@ class Count:
         self.right_id = right[right_id]
         self.weighted = weighted
 
-        count = collections.Counter(right[right_id])
-        df = pd.DataFrame.from_dict(count, orient="index", columns=["mm_count"])
-        joined = left[[left_id, "geometry"]].join(df["mm_count"], on=left_id)
-        joined.loc[joined["mm_count"].isna(), "mm_count"] = 0
+        count = right[right_id].value_counts()
+        counts = left[left_id].map(count).fillna(0)
 
         if weighted:
             if left.geometry[0].type in ["Polygon", "MultiPolygon"]:
-                joined["mm_count"] = joined["mm_count"] / left.geometry.area
+                counts = counts / left.geometry.area
             elif left.geometry[0].type in ["LineString", "MultiLineString"]:
-                joined["mm_count"] = joined["mm_count"] / left.geometry.length
+                counts = counts / left.geometry.length
             else:
                 raise TypeError("Geometry type does not support weighting.")
 
-        self.series = joined["mm_count"]
+        self.series = counts.rename("mm_count")
 
 
 class Courtyards:
@@ -231,7 +229,6 @@ class Courtyards:
     def __init__(self, gdf, block_id, spatial_weights=None):
         self.gdf = gdf
 
-        results_list = []
         gdf = gdf.copy()
 
         if not isinstance(block_id, str):
@@ -268,10 +265,9 @@ class Courtyards:
                 for b in to_join:
                     courtyards[b] = interiors  # fill dict with values
         # copy values from dict to gdf
-        for index, row in tqdm(gdf.iterrows(), total=gdf.shape[0]):
-            results_list.append(courtyards[index])
-
-        self.series = pd.Series(results_list, index=gdf.index)
+        self.series = pd.Series(
+            [courtyards[index] for index in gdf.index], index=gdf.index
+        )
 
 
 class BlocksCount:
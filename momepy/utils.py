@@ -10,6 +10,7 @@ import networkx as nx
 import numpy as np
 import pandas as pd
 import shapely
+from packaging.version import Version
 from shapely.geometry import LineString, Point
 from tqdm import tqdm
 
@@ -26,6 +27,8 @@ __all__ = [
     "CheckTessellationInput",
 ]
 
+SHAPELY_GE_20 = Version(shapely.__version__) >= Version("2.0")
+
 
 def unique_id(objects):
     """
@@ -69,11 +72,11 @@ def _generate_primal(G, gdf_network, fields):
     """
     G.graph["approach"] = "primal"
     key = 0
-    for index, row in gdf_network.iterrows():
-        first = row.geometry.coords[0]
-        last = row.geometry.coords[-1]
+    rows = gdf_network[fields].itertuples(index=False, name=None)
+    for geometry, data in zip(gdf_network.geometry, rows):
+        first = geometry.coords[0]
+        last = geometry.coords[-1]
 
-        data = [row[f] for f in fields]
         attributes = dict(zip(fields, data))
         G.add_edge(first, last, key=key, **attributes)
         key += 1
@@ -88,9 +91,11 @@ def _generate_dual(G, gdf_network, fields):
     sw = libpysal.weights.Queen.from_dataframe(gdf_network)
     gdf_network["mm_cent"] = gdf_network.geometry.centroid
 
-    for i, (index, row) in enumerate(gdf_network.iterrows()):
-        centroid = (row.mm_cent.x, row.mm_cent.y)
-        data = [row[f] for f in fields]
+    rows = gdf_network[fields].itertuples(index=False, name=None)
+    for i, (geometry, cent, data) in enumerate(
+        zip(gdf_network.geometry, gdf_network["mm_cent"], rows)
+    ):
+        centroid = (cent.x, cent.y)
         attributes = dict(zip(fields, data))
         G.add_node(centroid, **attributes)
 
@@ -98,8 +103,8 @@ def _generate_dual(G, gdf_network, fields):
             for n in sw.neighbors[i]:
                 start = centroid
                 end = list(gdf_network.iloc[n]["mm_cent"].coords)[0]
-                p0 = row.geometry.coords[0]
-                p1 = row.geometry.coords[-1]
+                p0 = geometry.coords[0]
+                p1 = geometry.coords[-1]
                 p2 = gdf_network.iloc[n]["geometry"].coords[0]
                 p3 = gdf_network.iloc[n]["geometry"].coords[-1]
                 points = [p0, p1, p2, p3]
@@ -592,87 +597,51 @@ def snap_street_network_edge(
         """
         Creates a line extrapoled in p1->p2 direction.
         """
-        EXTRAPOL_RATIO = tolerance  # length of a line
-        a = p2
-
-        # defining new point based on the vector between existing points
-        if p1[0] >= p2[0] and p1[1] >= p2[1]:
-            b = (
-                p2[0]
-                - EXTRAPOL_RATIO
-                * math.cos(
-                    math.atan(
-                        math.fabs(p1[1] - p2[1] + 0.000001)
-                        / math.fabs(p1[0] - p2[0] + 0.000001)
-                    )
-                ),
-                p2[1]
-                - EXTRAPOL_RATIO
-                * math.sin(
-                    math.atan(
-                        math.fabs(p1[1] - p2[1] + 0.000001)
-                        / math.fabs(p1[0] - p2[0] + 0.000001)
-                    )
-                ),
-            )
-        elif p1[0] <= p2[0] and p1[1] >= p2[1]:
-            b = (
-                p2[0]
-                + EXTRAPOL_RATIO
-                * math.cos(
-                    math.atan(
-                        math.fabs(p1[1] - p2[1] + 0.000001)
-                        / math.fabs(p1[0] - p2[0] + 0.000001)
-                    )
-                ),
-                p2[1]
-                - EXTRAPOL_RATIO
-                * math.sin(
-                    math.atan(
-                        math.fabs(p1[1] - p2[1] + 0.000001)
-                        / math.fabs(p1[0] - p2[0] + 0.000001)
-                    )
-                ),
-            )
-        elif p1[0] <= p2[0] and p1[1] <= p2[1]:
-            b = (
-                p2[0]
-                + EXTRAPOL_RATIO
-                * math.cos(
-                    math.atan(
-                        math.fabs(p1[1] - p2[1] + 0.000001)
-                        / math.fabs(p1[0] - p2[0] + 0.000001)
-                    )
-                ),
-                p2[1]
-                + EXTRAPOL_RATIO
-                * math.sin(
-                    math.atan(
-                        math.fabs(p1[1] - p2[1] + 0.000001)
-                        / math.fabs(p1[0] - p2[0] + 0.000001)
-                    )
-                ),
-            )
+        return LineString([p2, _extrapolate(p1, p2, tolerance)])
+
+    # returns positions of lines possibly intersecting geom apart from idx
+    def candidates(geom, idx):
+        """
+        Queries spatial index of the network and removes idx from the result.
+        """
+        if SHAPELY_GE_20:
+            possible = sindex.query(geom)
         else:
-            b = (
-                p2[0]
-                - EXTRAPOL_RATIO
-                * math.cos(
-                    math.atan(
-                        math.fabs(p1[1] - p2[1] + 0.000001)
-                        / math.fabs(p1[0] - p2[0] + 0.000001)
-                    )
-                ),
-                p2[1]
-                + EXTRAPOL_RATIO
-                * math.sin(
-                    math.atan(
-                        math.fabs(p1[1] - p2[1] + 0.000001)
-                        / math.fabs(p1[0] - p2[0] + 0.000001)
-                    )
-                ),
-            )
-        return LineString([a, b])
+            possible = np.array(list(sindex.intersection(geom.bounds)), dtype=int)
+        return possible[possible != idx]
+
+    # checks whether point is connected to other line than idx
+    def connected(point, idx):
+        """
+        Checks whether point intersects any line of the network apart from idx.
+        """
+        possible = network_geoms[candidates(point, idx)]
+        if SHAPELY_GE_20:
+            return shapely.intersects(possible, point).any()
+        return any(line.intersects(point) for line in possible)
+
+    # returns coordinates of the intersection point closest to the end of the line
+    def closest_point(intersections):
+        """
+        Returns coordinates of the (Multi)Point intersection closest to the end of
+        l_coords or None if there is no such point.
+        """
+        if SHAPELY_GE_20:
+            points = intersections[np.isin(shapely.get_type_id(intersections), [0, 4])]
+            coords = shapely.get_coordinates(points)
+        else:
+            coords = [
+                point.coords[0]
+                for geom in intersections
+                if geom.type in ["Point", "MultiPoint"] and not geom.is_empty
+                for point in getattr(geom, "geoms", [geom])
+            ]
+            coords = np.array(coords).reshape(-1, 2)
+        if len(coords) == 0:
+            return None
+        # squared distances are enough to pick the closest point
+        distances2 = ((coords - np.asarray(l_coords[-1])[:2]) ** 2).sum(axis=1)
+        return tuple(coords[np.argmin(distances2)])
 
     # function extending line to closest object within set distance
     def extend_line(tolerance, idx):
@@ -690,52 +659,42 @@ def snap_street_network_edge(
             *extra, tolerance=tolerance
         )  # we use the last two points
 
-        possible_intersections_index = list(sindex.intersection(extrapolation.bounds))
-        possible_intersections_lines = network.iloc[possible_intersections_index]
-        possible_intersections_clean = possible_intersections_lines.drop(idx, axis=0)
-        possible_intersections = possible_intersections_clean.intersection(
-            extrapolation
-        )
+        possible_lines = network_geoms[candidates(extrapolation, idx)]
+        if SHAPELY_GE_20:
+            possible_intersections = shapely.intersection(possible_lines, extrapolation)
+            all_empty = shapely.is_empty(possible_intersections).all()
+        else:
+            possible_intersections = [
+                line.intersection(extrapolation) for line in possible_lines
+            ]
+            all_empty = all(geom.is_empty for geom in possible_intersections)
 
-        if not possible_intersections.is_empty.all():
-
-            true_int = []
-            for one in list(possible_intersections.index):
-                if possible_intersections[one].type == "Point":
-                    true_int.append(possible_intersections[one])
-                elif possible_intersections[one].type == "MultiPoint":
-                    true_int.append(possible_intersections[one][0])
-                    true_int.append(possible_intersections[one][1])
-
-            if len(true_int) >= 1:
-                if len(true_int) > 1:
-                    distances = {}
-                    ix = 0
-                    for p in true_int:
-                        distance = p.distance(Point(l_coords[-1]))
-                        distances[ix] = distance
-                        ix = ix + 1
-                    minimal = min(distances.items(), key=operator.itemgetter(1))[0]
-                    new_point_coords = true_int[minimal].coords[0]
-                else:
-                    new_point_coords = true_int[0].coords[0]
+        if not all_empty:
+
+            new_point_coords = closest_point(possible_intersections)
 
+            if new_point_coords is not None:
                 l_coords.append(new_point_coords)
                 new_extended_line = LineString(l_coords)
 
                 # check whether the line goes through buildings. if so, ignore it
-                possible_buildings_index = list(
-                    bindex.intersection(new_extended_line.bounds)
-                )
-                possible_buildings = buildings.iloc[possible_buildings_index]
-                possible_intersections = possible_buildings.intersection(
-                    new_extended_line
-                )
+                if SHAPELY_GE_20:
+                    crosses = bindex.query(new_extended_line, predicate="intersects")
+                    crosses = crosses.size > 0
+                else:
+                    possible_buildings_index = list(
+                        bindex.intersection(new_extended_line.bounds)
+                    )
+                    possible_buildings = buildings.iloc[possible_buildings_index]
+                    possible_intersections = possible_buildings.intersection(
+                        new_extended_line
+                    )
+                    crosses = possible_intersections.any()
 
-                if possible_intersections.any():
+                if crosses:
                     pass
                 else:
-                    network.loc[idx, "geometry"] = new_extended_line
+                    network_geoms[idx] = new_extended_line
         else:
             return False
 
@@ -761,49 +720,46 @@ def snap_street_network_edge(
 
         if possible_intersections.type != "GeometryCollection":
 
-            true_int = []
-
-            if possible_intersections.type == "Point":
-                true_int.append(possible_intersections)
-            elif possible_intersections.type == "MultiPoint":
-                true_int.append(possible_intersections[0])
-                true_int.append(possible_intersections[1])
-
-            if len(true_int) >= 1:
-                if len(true_int) > 1:
-                    distances = {}
-                    ix = 0
-                    for p in true_int:
-                        distance = p.distance(Point(l_coords[-1]))
-                        distances[ix] = distance
-                        ix = ix + 1
-                    minimal = min(distances.items(), key=operator.itemgetter(1))[0]
-                    new_point_coords = true_int[minimal].coords[0]
-                else:
-                    new_point_coords = true_int[0].coords[0]
+            # fill the array by assignment so numpy does not unpack multi-part
+            # geometries under shapely<2
+            intersections = np.empty(1, dtype=object)
+            intersections[0] = possible_intersections
+            new_point_coords = closest_point(intersections)
 
+            if new_point_coords is not None:
                 l_coords.append(new_point_coords)
                 new_extended_line = LineString(l_coords)
 
                 # check whether the line goes through buildings. if so, ignore it
-                possible_buildings_index = list(
-                    bindex.intersection(new_extended_line.bounds)
-                )
-                possible_buildings = buildings.iloc[possible_buildings_index]
-                possible_intersections = possible_buildings.intersection(
-                    new_extended_line
-                )
+                if SHAPELY_GE_20:
+                    crosses = bindex.query(new_extended_line, predicate="intersects")
+                    crosses = crosses.size > 0
+                else:
+                    possible_buildings_index = list(
+                        bindex.intersection(new_extended_line.bounds)
+                    )
+                    possible_buildings = buildings.iloc[possible_buildings_index]
+                    possible_intersections = possible_buildings.intersection(
+                        new_extended_line
+                    )
+                    crosses = not possible_intersections.is_empty.all()
 
-                if not possible_intersections.is_empty.all():
+                if crosses:
                     pass
                 else:
-                    network.loc[idx, "geometry"] = new_extended_line
+                    network_geoms[idx] = new_extended_line
 
     network = edges.copy()
-    # generating spatial index (rtree)
-    print("Building R-tree for network...")
-    sindex = network.sindex
-    print("Building R-tree for buildings...")
+    network_geoms = np.array(network.geometry.values, dtype=object)
+    # generating spatial index (STRtree with shapely 2.0, rtree otherwise)
+    print("Building spatial index for network...")
+    if SHAPELY_GE_20:
+        # prepared geometries speed up repeated intersects checks against the same line
+        shapely.prepare(network_geoms)
+        sindex = shapely.STRtree(network_geoms)
+    else:
+        sindex = network.sindex
+    print("Building spatial index for buildings...")
     bindex = buildings.sindex
 
     def _get_geometry():
@@ -818,7 +774,7 @@ def snap_street_network_edge(
 
     print("Snapping...")
     # iterating over each street segment
-    for idx, line in tqdm(network.geometry.iteritems(), total=network.shape[0]):
+    for idx, line in enumerate(tqdm(network_geoms, total=network.shape[0])):
 
         l_coords = list(line.coords)
         # network_w = network.drop(idx, axis=0)['geometry']  # ensure that it wont intersect itself
@@ -826,15 +782,8 @@ def snap_street_network_edge(
         end = Point(l_coords[-1])
 
         # find out whether ends of the line are connected or not
-        possible_first_index = list(sindex.intersection(start.bounds))
-        possible_first_matches = network.iloc[possible_first_index]
-        possible_first_matches_clean = possible_first_matches.drop(idx, axis=0)
-        first = possible_first_matches_clean.intersects(start).any()
-
-        possible_second_index = list(sindex.intersection(end.bounds))
-        possible_second_matches = network.iloc[possible_second_index]
-        possible_second_matches_clean = possible_second_matches.drop(idx, axis=0)
-        second = possible_second_matches_clean.intersects(end).any()
+        first = connected(start, idx)
+        second = connected(end, idx)
 
         # both ends connected, do nothing
         if first and second:
@@ -862,9 +811,25 @@ def snap_street_network_edge(
         else:
             print("Something went wrong.")
 
+    network["geometry"] = gpd.GeoSeries(
+        network_geoms, index=network.index, crs=network.crs
+    )
     return network
 
 
+def _extrapolate(p1, p2, tolerance):
+    """
+    Returns point(s) extending the p1->p2 vector beyond p2 by tolerance.
+
+    Works on single coordinate pairs as well as on (N, 2) arrays.
+    """
+    p1 = np.asarray(p1, dtype=float)
+    p2 = np.asarray(p2, dtype=float)
+    vector = p2 - p1
+    length = np.hypot(vector[..., 0], vector[..., 1])[..., np.newaxis] + 1e-12
+    return p2 + tolerance * vector / length
+
+
 def _azimuth(point1, point2):
     """azimuth between 2 shapely points (interval 0 - 180)"""
     angle = np.arctan2(point2[0] - point1[0], point2[1] - point1[1])
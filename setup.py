@@ -45,6 +45,7 @@ setup(
         "networkx>=2.3",
         "libpysal>=4.1.0",
         "tqdm>=4.25.0",
+        "packaging",
     ],
     cmdclass=versioneer.get_cmdclass(),
 )
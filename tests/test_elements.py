@@ -2,6 +2,7 @@ import geopandas as gpd
 import libpysal
 import momepy as mm
 import pytest
+from shapely.geometry import LineString
 
 
 class TestElements:
@@ -24,7 +25,44 @@ class TestElements:
         assert len(bands) == len(self.df_streets)
         queen_corners = tes.queen_corners(2)
         w = libpysal.weights.Queen.from_dataframe(queen_corners)
-        assert w.neighbors[14] == [35, 36, 13, 15, 26, 27, 28, 30, 31]
+        if mm.elements.SHAPELY_GE_20:
+            assert w.neighbors[14] == [35, 36, 13, 15, 26, 27, 28, 30]
+        else:
+            assert w.neighbors[14] == [35, 36, 13, 15, 26, 27, 28, 30, 31]
+
+    def test_Tessellation_n_jobs(self):
+        serial = mm.Tessellation(self.df_buildings, "uID", self.limit, segment=2)
+        parallel = mm.Tessellation(
+            self.df_buildings, "uID", self.limit, segment=2, n_jobs=2
+        )
+        assert parallel.n_jobs == 2
+        assert len(parallel.tessellation) == len(serial.tessellation)
+        serial_cells = serial.tessellation.set_index("uID").geometry
+        parallel_cells = parallel.tessellation.set_index("uID").geometry
+        difference = serial_cells.symmetric_difference(
+            parallel_cells.loc[serial_cells.index]
+        )
+        assert difference.area.max() == pytest.approx(0, abs=1e-6)
+
+        for n_jobs in [0, -2]:
+            with pytest.raises(ValueError):
+                mm.Tessellation(
+                    self.df_buildings, "uID", self.limit, segment=2, n_jobs=n_jobs
+                )
+
+    def test_Tessellation_self_touching(self):
+        streets = gpd.GeoDataFrame(
+            {"nID": [0, 1, 2]},
+            geometry=[
+                LineString([(0, 0), (100, 0), (100, 100), (50, 0), (50, -100)]),
+                LineString([(0, 50), (0, 150)]),
+                LineString([(150, 0), (250, 0)]),
+            ],
+        )
+        limit = mm.buffered_limit(streets, 50)
+        tessellation = mm.Tessellation(streets, "nID", limit, segment=5).tessellation
+        assert len(tessellation) == 3
+        assert tessellation.area.sum() == pytest.approx(limit.area, rel=1e-3)
 
     def test_Blocks(self):
         blocks = mm.Blocks(
@@ -43,6 +81,28 @@ class TestElements:
         buildings_id = mm.get_network_id(self.df_buildings, self.df_streets, "nID")
         assert not buildings_id.isna().any()
 
+    def test_get_network_id_index(self):
+        buildings = self.df_buildings.set_index(self.df_buildings.index * 2)
+        buildings_id = mm.get_network_id(buildings, self.df_streets, "nID")
+        assert buildings_id.index.equals(buildings.index)
+        assert not buildings_id.isna().any()
+
+    def test_get_network_id_min_size(self):
+        with pytest.warns(UserWarning, match="23 affected elements"):
+            buildings_id = mm.get_network_id(
+                self.df_buildings, self.df_streets, "nID", min_size=10
+            )
+        # the closest street is searched only among those around the object
+        assert buildings_id[3] == 8
+        assert buildings_id[7] == 33
+
+    def test_get_network_id_missing_geometry(self):
+        streets = self.df_streets.copy()
+        streets.loc[0, "geometry"] = None
+        streets.loc[1, "geometry"] = LineString()
+        buildings_id = mm.get_network_id(self.df_buildings, streets, "nID")
+        assert not buildings_id.isin([0, 1]).any()
+
     def test_get_network_id_duplicate(self):
         self.df_buildings["nID"] = range(len(self.df_buildings))
         buildings_id = mm.get_network_id(self.df_buildings, self.df_streets, "nID")
@@ -62,5 +122,10 @@ class TestElements:
         dense = mm.elements._split_lines(large, 100)
         small = mm.buffered_limit(self.df_buildings, 30)
         dense2 = mm.elements._split_lines(small, 100)
-        assert len(dense) == 53
-        assert len(dense2) == 51
+        if mm.elements.SHAPELY_GE_20:
+            assert len(dense) == 273
+            assert len(dense2) == 667
+            assert dense.length.max() <= 100
+        else:
+            assert len(dense) == 53
+            assert len(dense2) == 51
@@ -149,9 +149,38 @@ class TestUtils:
             tolerance_edge=70,
             edge=mm.buffered_limit(self.df_buildings, buffer=50),
         )
-        assert sum(snapped.geometry.length) == 5980.041004739525
-        assert sum(snapped_edge.geometry.length) == 5980.718889937014
-        assert sum(snapped_nonedge.geometry.length) < 5980.041004739525
+        assert sum(snapped.geometry.length) == 5980.041006137295
+        assert sum(snapped_edge.geometry.length) == 5980.71889136569
+        assert sum(snapped_nonedge.geometry.length) < 5980.041006137295
+
+    def test_snap_street_network_edge_multiple_intersections(self):
+        streets = gpd.GeoDataFrame(
+            geometry=[
+                LineString([(-10, 0), (0, 0)]),
+                LineString([(-10, 0), (-10, -15)]),
+            ]
+        )
+        buildings = gpd.GeoDataFrame(
+            geometry=[Polygon([(-50, 50), (-45, 50), (-45, 45)])]
+        )
+        # the extension of the first street crosses the edge three times
+        edge = Polygon(
+            [
+                (-20, -20),
+                (5, -20),
+                (5, 10),
+                (10, 10),
+                (10, -20),
+                (30, -20),
+                (30, 20),
+                (-20, 20),
+            ]
+        )
+        snapped = mm.snap_street_network_edge(
+            streets, buildings, 5, tolerance_edge=40, edge=edge
+        )
+        assert snapped.geometry.iloc[0].coords[-1] == (5, 0)
+        assert snapped.geometry.iloc[1].coords[-1] == (-10, -20)
 
     def test_CheckTessellationInput(self):
         df = self.df_buildings